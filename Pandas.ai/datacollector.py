@@ -10,8 +10,10 @@ db_path = os.path.join('..', 'pii_scan_history.db')
 
 conn = sqlite3.connect(db_path)
 
-# Query the scan_history table
-pandas_df = pd.read_sql_query("SELECT * FROM scan_history", conn)
+# Query the scan_history table into Arrow-backed columns, which avoids
+# holding every value as a Python object (needs pandas 2.0 and pyarrow)
+pandas_df = pd.read_sql_query("SELECT * FROM scan_history", conn,
+                              dtype_backend="pyarrow")
 
 # Close the connection
 conn.close()
@@ -0,0 +1,98 @@
+import os
+import argparse
+import logging
+
+import torch
+from gliner import GLiNER
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def export_to_onnx(model_name, output_dir, onnx_file="model.onnx"):
+    """Export a GLiNER model to ONNX for use with GLINER_BACKEND=onnx."""
+    gliner_model = GLiNER.from_pretrained(model_name, load_tokenizer=True)
+    gliner_model.eval()
+
+    if hasattr(gliner_model, "export_to_onnx"):
+        # Newer GLiNER releases export every model architecture themselves, and write the
+        # config and tokenizer next to the ONNX graph
+        onnx_path = gliner_model.export_to_onnx(output_dir, onnx_filename=onnx_file)["onnx_path"]
+        logger.info(f"Exported ONNX model to {onnx_path}")
+        return onnx_path
+
+    if not hasattr(gliner_model, "prepare_model_inputs"):
+        raise RuntimeError("This GLiNER release has neither export_to_onnx nor prepare_model_inputs, "
+                           "install a release that provides export_to_onnx")
+
+    # Save the config and tokenizer next to the ONNX graph so the scanner can load the directory
+    os.makedirs(output_dir, exist_ok=True)
+    gliner_model.save_pretrained(output_dir)
+
+    # Older releases are traced here with a representative input
+    text = "John Smith lives at 42 Main Street and his email is john.smith@example.com."
+    labels = ["person", "address", "email"]
+    inputs, _ = gliner_model.prepare_model_inputs([text], labels)
+
+    # Batch and sequence dimensions stay dynamic so batched scanning still works
+    if gliner_model.config.span_mode == "token_level":
+        input_names = ["input_ids", "attention_mask", "words_mask", "text_lengths"]
+        dynamic_axes = {
+            "input_ids": {0: "batch_size", 1: "sequence_length"},
+            "attention_mask": {0: "batch_size", 1: "sequence_length"},
+            "words_mask": {0: "batch_size", 1: "sequence_length"},
+            "text_lengths": {0: "batch_size", 1: "value"},
+            "logits": {0: "position", 1: "batch_size", 2: "sequence_length", 3: "num_classes"},
+        }
+    else:
+        input_names = ["input_ids", "attention_mask", "words_mask", "text_lengths", "span_idx", "span_mask"]
+        dynamic_axes = {
+            "input_ids": {0: "batch_size", 1: "sequence_length"},
+            "attention_mask": {0: "batch_size", 1: "sequence_length"},
+            "words_mask": {0: "batch_size", 1: "sequence_length"},
+            "text_lengths": {0: "batch_size", 1: "value"},
+            "span_idx": {0: "batch_size", 1: "num_spans", 2: "idx"},
+            "span_mask": {0: "batch_size", 1: "num_spans"},
+            "logits": {0: "batch_size", 1: "sequence_length", 2: "num_spans", 3: "num_classes"},
+        }
+
+    onnx_path = os.path.join(output_dir, onnx_file)
+    with torch.inference_mode():
+        torch.onnx.export(
+            gliner_model.model,
+            tuple(inputs[name] for name in input_names),
+            f=onnx_path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+    logger.info(f"Exported ONNX model to {onnx_path}")
+    return onnx_path
+
+def quantize_onnx(onnx_path, quantized_file="model_quantized.onnx", per_channel=True):
+    """Write an int8 dynamically quantized copy of an exported ONNX model."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    # Weights are stored as int8, activations are quantized per batch at runtime.
+    # A scale per output channel keeps more accuracy than one per tensor, and the
+    # full int8 range suits VNNI/AMX CPUs
+    quantized_path = os.path.join(os.path.dirname(onnx_path), quantized_file)
+    quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8,
+                     per_channel=per_channel, reduce_range=False)
+    logger.info(f"Quantized ONNX model to {quantized_path}, set GLINER_ONNX_FILE={quantized_file} to use it")
+    return quantized_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a GLiNER model to ONNX for the PII Scanner")
+    parser.add_argument("--model", default=os.getenv("PII_MODEL_NAME", "urchade/gliner_multi_pii-v1"),
+                        help="GLiNER model name or path (default: PII_MODEL_NAME)")
+    parser.add_argument("--output", default="onnx_model", help="Directory to write the exported model to")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Also write an int8 quantized model_quantized.onnx (faster on CPU)")
+    parser.add_argument("--per-tensor", action="store_true",
+                        help="Quantize with one scale per weight tensor instead of per channel")
+    args = parser.parse_args()
+
+    onnx_path = export_to_onnx(args.model, args.output)
+    if args.quantize:
+        quantize_onnx(onnx_path, per_channel=not args.per_tensor)
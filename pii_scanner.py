@@ -8,19 +8,29 @@ warnings.filterwarnings("ignore")
 
 # Create a more aggressive stdout suppressor
 class SuppressStdoutStderr:
-    def __init__(self):
-        self.null_fds = [os.open(os.devnull, os.O_RDWR) for x in range(2)]
-        self.save_fds = [os.dup(1), os.dup(2)]
+    # Opened once and shared, so each use only costs the dup2 calls
+    null_fd = None
+    save_fds = None
 
     def __enter__(self):
-        os.dup2(self.null_fds[0], 1)
-        os.dup2(self.null_fds[1], 2)
+        if SuppressStdoutStderr.null_fd is None:
+            SuppressStdoutStderr.null_fd = os.open(os.devnull, os.O_RDWR)
+            SuppressStdoutStderr.save_fds = [os.dup(1), os.dup(2)]
+        # Write out pending output first, e.g. PII_DETECTED lines, or it would go to devnull
+        self.flush()
+        os.dup2(self.null_fd, 1)
+        os.dup2(self.null_fd, 2)
 
     def __exit__(self, *_):
+        self.flush()
         os.dup2(self.save_fds[0], 1)
         os.dup2(self.save_fds[1], 2)
-        for fd in self.null_fds + self.save_fds:
-            os.close(fd)
+
+    @staticmethod
+    def flush():
+        for stream in (sys.stdout, sys.stderr):
+            if stream:
+                stream.flush()
 
 warnings.filterwarnings("ignore", category=UserWarning)  # General UserWarnings
 warnings.filterwarnings("ignore", module="gliner")  # All GLiNER warnings
@@ -33,37 +43,49 @@ os.environ["TQDM_DISABLE"] = "1"
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 os.environ["TRANSFORMERS_NO_ADVISORY_WARNINGS"] = "1"
 
+# Keep torch.compile artifacts between runs so GLINER_COMPILE only pays the full
+# compile cost once, must be set before torch is imported
+COMPILE_CACHE_DIR = os.path.join(os.environ.get("PROGRAMDATA", ""), "PII Scanner", "compile_cache")
+os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(COMPILE_CACHE_DIR, "inductor"))
+os.environ.setdefault("TRITON_CACHE_DIR", os.path.join(COMPILE_CACHE_DIR, "triton"))
+os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+
 import sqlite3
 import hashlib
+import json
+import ast
+import mmap
+import re
+import zipfile
+import xml.etree.ElementTree as ET
 from datetime import datetime, timezone
 from docx import Document
 from pptx import Presentation
 from openpyxl import load_workbook
-from gliner import GLiNER
-from termcolor import colored
 from dotenv import load_dotenv
 import argparse
 import logging
+import atexit
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 
-# Add LOG_LEVEL definition
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-LOG_FILE = os.path.join(os.environ.get("PROGRAMDATA", ""), "PII Scanner", "pii_scanner.log")
-
-# Simplify logging setup
-handler = logging.StreamHandler(sys.stdout)
-handler.setLevel(logging.INFO)
-
-# Configure logging with handler
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL.upper()),
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[handler]
-)
-
-logger = logging.getLogger(__name__)
+# Imported by import_gliner(), the scan worker processes re-import this module and
+# only need the file readers
+torch = None
+GLiNER = None
+InferencePackingConfig = None
 
-# Disable tqdm progress bars
+try:
+    import blake3
+except ImportError:
+    blake3 = None
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 def get_env_file_path():
     """Get the path to the .env file based on whether running as exe or script"""
@@ -74,14 +96,40 @@ def get_env_file_path():
         # Running as script
         return os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
 
-# Load environment variables from .env file
+# Scan worker processes are started with spawn and re-run this module, they inherit
+# the configuration from the main process
+IS_WORKER_PROCESS = multiprocessing.current_process().name != "MainProcess" or "--multiprocessing-fork" in sys.argv
+
+# Load environment variables from .env file, before any setting (LOG_LEVEL included) is read
 env_path = get_env_file_path()
-if os.path.exists(env_path):
+env_loaded = not IS_WORKER_PROCESS and os.path.exists(env_path)
+if env_loaded:
     load_dotenv(env_path)
+
+# Add LOG_LEVEL definition
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING")  # INFO adds one line per file, --verbose enables DEBUG
+LOG_FILE = os.path.join(os.environ.get("PROGRAMDATA", ""), "PII Scanner", "pii_scanner.log")
+
+# Simplify logging setup, the logger level decides what is emitted
+handler = logging.StreamHandler(sys.stdout)
+
+# Configure logging with handler
+logging.basicConfig(
+    level=getattr(logging, LOG_LEVEL.upper()),
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[handler]
+)
+
+logger = logging.getLogger(__name__)
+
+if env_loaded:
     logger.info(f"Loaded configuration from {env_path}")
-else:
+elif not IS_WORKER_PROCESS:
     logger.warning(f"No .env file found at {env_path}, using defaults")
 
+# Disable tqdm progress bars
+
+
 def get_application_path():
     """Get the base path for the application, works in both script and exe"""
     if getattr(sys, 'frozen', False):
@@ -99,6 +147,14 @@ ALLOWED_FILE_TYPES = {".doc", ".docx", ".xlsx", ".pptx", ".txt"}
 MAX_CHUNK_LENGTH = int(os.getenv("MAX_CHUNK_LENGTH", "384"))  # Changed default to 384
 LITE_SCAN_LIMIT = 1024 * 1024  # 1MB limit for lite scan
 PII_MODEL_NAME = os.getenv("PII_MODEL_NAME", "urchade/gliner_multi_pii-v1")
+GLINER_BATCH_SIZE = int(os.getenv("GLINER_BATCH_SIZE", "16"))  # Chunks per GLiNER forward pass
+GLINER_DTYPE = os.getenv("GLINER_DTYPE", "fp32").lower()  # fp32, fp16 (GPU only) or bf16
+GLINER_COMPILE = os.getenv("GLINER_COMPILE", "0") == "1"  # torch.compile the GLiNER encoder
+GLINER_QUANTIZE = os.getenv("GLINER_QUANTIZE", "0") == "1"  # Dynamic int8 quantization on CPU
+GLINER_PACKING = os.getenv("GLINER_PACKING", "0") == "1"  # Pack short chunks into shared sequences
+GLINER_CACHE_LABELS = os.getenv("GLINER_CACHE_LABELS", "1") == "1"  # Reuse label embeddings (bi-encoder models)
+GLINER_BACKEND = os.getenv("GLINER_BACKEND", "torch").lower()  # torch or onnx
+GLINER_ONNX_FILE = os.getenv("GLINER_ONNX_FILE", "model.onnx")  # ONNX file inside the model directory
 
 # Default PII labels if not specified in .env
 DEFAULT_PII_LABELS = [
@@ -110,14 +166,38 @@ DEFAULT_PII_LABELS = [
 PII_LABELS = os.getenv("PII_LABELS", ",".join(DEFAULT_PII_LABELS)).split(",")
 PII_LABELS_FULL = os.getenv("PII_LABELS_FULL", ",".join(PII_LABELS)).split(",")
 
-# Print configured labels
-print(colored("\nConfigured PII labels:", "cyan"))
-print(colored("Basic labels:", "yellow"))
-for label in PII_LABELS:
-    print(colored(f"  - {label}", "yellow"))
+# Scan results written to the database per transaction
+DB_FLUSH_INTERVAL = int(os.getenv("DB_FLUSH_INTERVAL", "500"))
 
-print(colored("\nFull label set available:", "green"))
-print(colored(f"  Total labels: {len(PII_LABELS_FULL)}", "green"))
+# Chunks whose detections are remembered, 0 disables the cache
+PII_CACHE_SIZE = int(os.getenv("PII_CACHE_SIZE", "20000"))
+
+# Worker processes used to checksum and extract files in parallel
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", str(os.cpu_count() or 1)))
+# ProcessPoolExecutor refuses more than 61 workers on Windows
+MAX_SCAN_WORKERS = 61 if sys.platform == "win32" else None
+if MAX_SCAN_WORKERS and SCAN_WORKERS > MAX_SCAN_WORKERS:
+    SCAN_WORKERS = MAX_SCAN_WORKERS
+
+# Checksums only identify unchanged files, so speed matters more than cryptographic strength
+CHECKSUM_ALGORITHM = os.getenv("CHECKSUM_ALGORITHM", "blake3").lower()  # blake3, xxh3_64, xxh3_128 or any hashlib name
+XXHASH_ALGORITHMS = {"xxh3_64", "xxh3_128"}
+if CHECKSUM_ALGORITHM == "blake3" and blake3 is None:
+    logger.debug("blake3 is not installed, using sha256 checksums")
+    CHECKSUM_ALGORITHM = "sha256"
+elif CHECKSUM_ALGORITHM in XXHASH_ALGORITHMS and xxhash is None:
+    logger.warning(f"CHECKSUM_ALGORITHM={CHECKSUM_ALGORITHM} requires the xxhash package, using sha256")
+    CHECKSUM_ALGORITHM = "sha256"
+elif CHECKSUM_ALGORITHM not in XXHASH_ALGORITHMS | {"blake3"} and CHECKSUM_ALGORITHM not in hashlib.algorithms_available:
+    logger.warning(f"Unknown CHECKSUM_ALGORITHM '{CHECKSUM_ALGORITHM}', using sha256")
+    CHECKSUM_ALGORITHM = "sha256"
+
+def log_configured_labels():
+    """Log the configured PII labels, listing them individually at DEBUG level."""
+    logger.info(f"Configured PII labels: {len(PII_LABELS)} basic, {len(PII_LABELS_FULL)} full")
+    if logger.isEnabledFor(logging.DEBUG):
+        for label in PII_LABELS:
+            logger.debug(f"  - {label}")
 
 # Add these constants after the existing config section
 EXIT_SUCCESS = 0
@@ -137,118 +217,425 @@ EXIT_MISSING_PATH = 13
 EXIT_GENERAL_ERROR = 99
 
 # Ensure directories exist
-os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
+if not IS_WORKER_PROCESS:
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
 
 def init_nltk():
     """Initialize NLTK resources."""
     logger.info("NLTK initialization skipped - using GLiNER tokenizer")
     return
 
-# Initialize GLiNER model with proper configuration
-try:
-    model_config = {
-        'max_length': MAX_CHUNK_LENGTH,
-        'padding': 'max_length',
-        'truncation': True,
-        'add_prefix_space': True
-    }
+# Loaded by init_gliner_model() so worker processes do not load the model
+gliner_model = None
+
+def import_gliner():
+    """Import torch and GLiNER, only done by the process running inference."""
+    global torch, GLiNER, InferencePackingConfig
+    import torch
+    from gliner import GLiNER
+    try:
+        from gliner import InferencePackingConfig  # Newer GLiNER releases only
+    except ImportError:
+        InferencePackingConfig = None
+
+def init_gliner_model():
+    """Initialize GLiNER model with proper configuration."""
+    global gliner_model
+    try:
+        import_gliner()
+        
+        model_config = {
+            'max_length': MAX_CHUNK_LENGTH,
+            'truncation': True,
+            'add_prefix_space': True
+        }
+        
+        if GLINER_BACKEND == "onnx":
+            init_gliner_onnx_model(model_config)
+            return
+        
+        gliner_model = GLiNER.from_pretrained(
+            PII_MODEL_NAME,
+            **model_config
+        )
+        
+        # Run on the GPU when one is available, always in eval mode
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        gliner_model = gliner_model.to(device)
+        gliner_model.eval()
+        
+        if device == "cuda":
+            # Let fp32 matmuls run on TF32 tensor cores (Ampere and newer)
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+        elif device == "cpu":
+            # Intra-op threads stay at torch's default of one per physical core, the scan
+            # workers run on the same cores. Inference has no independent ops to overlap
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                # Only allowed before the first parallel op has run
+                pass
+        
+        # Reduced precision is opt-in since it can cost PII detection accuracy
+        dtypes = {"fp16": torch.float16, "bf16": torch.bfloat16}
+        if GLINER_DTYPE == "fp16" and device != "cuda":
+            logger.warning("GLINER_DTYPE=fp16 requires a GPU, using fp32")
+        elif GLINER_DTYPE in dtypes:
+            try:
+                gliner_model = gliner_model.to(dtypes[GLINER_DTYPE])
+                # Some backbones reject reduced precision, find out now rather than mid-scan
+                with SuppressStdoutStderr(), torch.inference_mode():
+                    predict_entities(["John Smith"], PII_LABELS)
+            except Exception as e:
+                logger.warning(f"GLINER_DTYPE={GLINER_DTYPE} is not supported by this model, using fp32: {e}")
+                gliner_model = gliner_model.to(torch.float32)
+        elif GLINER_DTYPE != "fp32":
+            logger.warning(f"Unknown GLINER_DTYPE '{GLINER_DTYPE}', using fp32")
+        
+        if GLINER_QUANTIZE:
+            quantize_gliner_model(device)
+        
+        if GLINER_COMPILE and not hasattr(torch, "compile"):
+            logger.warning("GLINER_COMPILE requires torch 2.0 or newer, running uncompiled")
+        elif GLINER_COMPILE:
+            eager_model = gliner_model.model
+            # GLiNER pads each batch to its longest chunk, so batch size and sequence length
+            # change from call to call, a dynamic graph avoids recompiling for every shape
+            gliner_model.model = torch.compile(eager_model, dynamic=True)
+        
+            # Pay the compile cost up front, a single chunk and a mixed-length batch cover
+            # the size 1 specialization and the dynamic graph
+            logger.info("Compiling GLiNER model, this may take a while...")
+            try:
+                with SuppressStdoutStderr(), torch.inference_mode():
+                    predict_entities(["x " * 64], PII_LABELS_FULL)
+                    predict_entities(["x " * 64, "x " * MAX_CHUNK_LENGTH], PII_LABELS_FULL)
+            except Exception as e:
+                # No usable compiler backend (e.g. no C++ toolchain on Windows), keep the eager model
+                logger.warning(f"torch.compile failed, running uncompiled: {e}")
+                gliner_model.model = eager_model
+        
+        if GLINER_PACKING:
+            init_inference_packing()
+        
+        init_label_embeddings()
+        
+        logger.info(f"GLiNER model '{PII_MODEL_NAME}' initialized successfully on {device}.")
+    except Exception as e:
+        logger.error(f"Error initializing GLiNER model: {e}")
+        gliner_model = None
+
+# Text used to check that a quantized model still finds the same PII
+QUANTIZE_CANARY = ("John Smith lives at 42 Main Street, Springfield. Call him on +1 555 0100 "
+                   "or email john.smith@example.com, his passport number is 123456789.")
+
+def quantize_gliner_model(device):
+    """Swap the GLiNER linear layers for dynamic int8 ones, if results on a canary text are unchanged."""
+    if device != "cpu" or GLINER_DTYPE != "fp32":
+        logger.warning("GLINER_QUANTIZE only applies to fp32 models on CPU, skipping")
+        return
+    fp32_model = gliner_model.model
+    try:
+        quantization = torch.ao.quantization if hasattr(torch, "ao") else torch.quantization
+        with SuppressStdoutStderr(), torch.inference_mode():
+            expected = predict_entities([QUANTIZE_CANARY], PII_LABELS_FULL)
+            gliner_model.model = quantization.quantize_dynamic(fp32_model, {torch.nn.Linear}, dtype=torch.qint8)
+            actual = predict_entities([QUANTIZE_CANARY], PII_LABELS_FULL)
+        found = lambda predictions: {(entity["text"], entity["label"]) for entity in predictions[0]}
+        if found(actual) != found(expected):
+            logger.warning("Quantized GLiNER model changed the canary detections, keeping fp32")
+            gliner_model.model = fp32_model
+        else:
+            logger.info("Quantized GLiNER model to int8")
+    except Exception as e:
+        logger.warning(f"Could not quantize GLiNER model, keeping fp32: {e}")
+        gliner_model.model = fp32_model
+
+def init_inference_packing():
+    """Let GLiNER pack several short chunks into one sequence with block-diagonal attention."""
+    if InferencePackingConfig is None or not hasattr(gliner_model, "configure_inference_packing"):
+        logger.warning("GLINER_PACKING requires a newer GLiNER release, running unpacked")
+        return
+    try:
+        tokenizer = gliner_model.data_processor.transformer_tokenizer
+        # The packer counts subword ids, label prompt included, and cuts anything longer
+        # than max_length, so size it from the encoder rather than MAX_CHUNK_LENGTH words
+        max_length = getattr(tokenizer, "model_max_length", None)
+        if not max_length or max_length > 1_000_000:  # Many tokenizer configs leave it unset
+            encoder_config = getattr(gliner_model.config, "encoder_config", None)
+            max_length = getattr(encoder_config, "max_position_embeddings", None) or 512
+        gliner_model.configure_inference_packing(InferencePackingConfig(
+            max_length=max_length,
+            sep_token_id=tokenizer.sep_token_id,
+            streams_per_batch=GLINER_BATCH_SIZE,
+        ))
+        logger.info(f"Enabled GLiNER inference packing, {max_length} tokens per stream")
+    except Exception as e:
+        logger.warning(f"Could not enable GLiNER inference packing: {e}")
+
+# Precomputed label embeddings per scan type, only filled for bi-encoder models
+label_embeddings = {}
+
+def init_label_embeddings():
+    """Encode the lite and full label sets once so each chunk skips the label encoder."""
+    label_embeddings.clear()
+    if not GLINER_CACHE_LABELS:
+        return
     
+    # Uni-encoder models read the labels and the text in one sequence, so only
+    # bi-encoder models have label embeddings that can be computed separately
+    if not getattr(gliner_model.config, "labels_encoder", None) or not hasattr(gliner_model, "encode_labels"):
+        logger.debug("Label embedding cache needs a bi-encoder GLiNER model, skipping")
+        return
+    
+    try:
+        with SuppressStdoutStderr(), torch.inference_mode():
+            label_embeddings["lite"] = gliner_model.encode_labels(PII_LABELS)
+            label_embeddings["full"] = gliner_model.encode_labels(PII_LABELS_FULL)
+        logger.info("Cached GLiNER label embeddings")
+    except Exception as e:
+        logger.warning(f"Could not cache GLiNER label embeddings: {e}")
+        label_embeddings.clear()
+
+def predict_entities(texts, labels, embeddings=None):
+    """Run texts through GLiNER, up to GLINER_BATCH_SIZE of them per forward pass."""
+    # GLiNER splits its input into batches of 8 unless told otherwise
+    if embeddings is not None:
+        return gliner_model.batch_predict_with_embeds(texts, embeddings, labels, batch_size=GLINER_BATCH_SIZE)
+    if hasattr(gliner_model, "inference"):
+        return gliner_model.inference(texts, labels, batch_size=GLINER_BATCH_SIZE)
+    return gliner_model.batch_predict_entities(texts, labels)  # Older GLiNER releases, one pass over all texts
+
+def init_gliner_onnx_model(model_config):
+    """Load a GLiNER model exported with convert_to_onnx.py into ONNX Runtime on the CPU."""
+    global gliner_model
+    import onnxruntime as ort
+
+    if MAX_CHUNK_LENGTH > 384:
+        logger.warning(f"MAX_CHUNK_LENGTH={MAX_CHUNK_LENGTH} is above 384, ONNX Runtime is slower on long sequences")
+
+    session_options = ort.SessionOptions()
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # intra_op_num_threads stays at ONNX Runtime's default of one per physical core,
+    # the scan workers run on the same cores
+
+    # PII_MODEL_NAME must point at the exported model directory
     gliner_model = GLiNER.from_pretrained(
         PII_MODEL_NAME,
+        load_onnx_model=True,
+        load_tokenizer=True,
+        onnx_model_file=GLINER_ONNX_FILE,
+        session_options=session_options,
         **model_config
     )
-    
-    logger.info(f"GLiNER model '{PII_MODEL_NAME}' initialized successfully.")
-except Exception as e:
-    logger.error(f"Error initializing GLiNER model: {e}")
-    gliner_model = None
+    logger.info(f"GLiNER ONNX model '{PII_MODEL_NAME}' ({GLINER_ONNX_FILE}) initialized successfully.")
+
+# One connection per thread, all tracked so they can be closed at exit
+_db_local = threading.local()
+_db_connections = []
+_db_connections_lock = threading.Lock()
+
+def get_db_connection():
+    """Return this thread's SQLite connection, opening it on first use."""
+    conn = getattr(_db_local, "conn", None)
+    if conn is None:
+        # Autocommit mode, each statement is its own transaction
+        conn = sqlite3.connect(DB_FILE, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")  # 64 MiB page cache, negative values are KiB
+        _db_local.conn = conn
+        with _db_connections_lock:
+            _db_connections.append(conn)
+    return conn
+
+def close_db_connection():
+    """Close every SQLite connection opened by get_db_connection."""
+    with _db_connections_lock:
+        for conn in _db_connections:
+            conn.close()
+        _db_connections.clear()
+    _db_local.__dict__.clear()
+
+atexit.register(close_db_connection)
 
 def init_db():
     """Initialize the SQLite database."""
-    conn = None
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        conn = get_db_connection()
         
         # Create the scan_history table
-        cursor.execute("""
+        conn.execute("""
             CREATE TABLE IF NOT EXISTS scan_history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 file_path TEXT NOT NULL,
                 scan_time TEXT NOT NULL,
                 file_size INTEGER,
                 file_modified TEXT,
+                file_inode INTEGER,
+                file_mtime_ns INTEGER,
                 file_checksum TEXT,
                 scan_type TEXT CHECK(scan_type IN ('lite', 'full')),
                 pii_entities TEXT,
                 UNIQUE(file_path, scan_type)
             )
         """)
-        conn.commit()
+
         logger.debug(f"Database initialized successfully at: {DB_FILE}")  # Changed to debug level
         
     except sqlite3.Error as e:
         logger.warning(f"Database initialization error: {e}")  # Changed to warning level
-        if conn:
-            conn.rollback()
         sys.exit(EXIT_DB_ERROR)
-    finally:
-        if conn:
-            conn.close()
+
+# 32-bit builds cannot map files larger than a couple of GiB, those are streamed instead
+MAX_MAP_SIZE = sys.maxsize if sys.maxsize > 2**32 else 2**31 - 1
+
+def map_file(f, limit=None):
+    """Memory-map an open file, or its first limit bytes, for sequential reading.
+
+    Returns None if the file is empty.
+    """
+    size = os.fstat(f.fileno()).st_size
+    if limit is not None:
+        size = min(size, limit)
+    if size == 0:
+        return None  # Empty files cannot be mapped
+    if size > MAX_MAP_SIZE:
+        raise ValueError(f"{size} bytes exceeds the address space of this build")
+    if hasattr(os, "posix_fadvise"):
+        # Ask the kernel for aggressive readahead before the pages are first touched
+        os.posix_fadvise(f.fileno(), 0, size, os.POSIX_FADV_SEQUENTIAL)
+    mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+    if hasattr(mmap, "MADV_SEQUENTIAL"):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    return mm
+
+def hash_file_stream(f, hasher):
+    """Feed an open file into a hasher using large buffered reads."""
+    if hasattr(hashlib, "file_digest"):
+        return hashlib.file_digest(f, lambda: hasher)  # Python 3.11+, read loop runs in C
+    for block in iter(lambda: f.read(1024 * 1024), b""):
+        hasher.update(block)
+    return hasher
+
+def new_hasher():
+    """Create a hasher for CHECKSUM_ALGORITHM."""
+    if CHECKSUM_ALGORITHM == "blake3":
+        # Large mapped files are hashed on all cores
+        return blake3.blake3(max_threads=blake3.blake3.AUTO)
+    if CHECKSUM_ALGORITHM in XXHASH_ALGORITHMS:
+        return getattr(xxhash, CHECKSUM_ALGORITHM)()
+    return hashlib.new(CHECKSUM_ALGORITHM)
 
 def calculate_checksum(file_path, scan_type):
-    """Calculate SHA256 checksum of a file."""
-    hasher = hashlib.sha256()
+    """Calculate the CHECKSUM_ALGORITHM checksum of a file."""
+    hasher = new_hasher()
     try:
         with open(file_path, "rb") as f:
-            if scan_type == "lite":
-                chunk = f.read(LITE_SCAN_LIMIT)
-                hasher.update(chunk)
-            else:
-                while True:
-                    chunk = f.read(4096)
-                    if not chunk:
-                        break
-                    hasher.update(chunk)
+            # Lite scans only map and hash the first LITE_SCAN_LIMIT bytes
+            limit = LITE_SCAN_LIMIT if scan_type == "lite" else None
+            try:
+                mm = map_file(f, limit)
+            except (OSError, ValueError) as e:
+                # Some file systems (e.g. network shares) cannot be mapped
+                logger.debug(f"Cannot memory-map {file_path}, streaming instead: {e}")
+                if limit is not None:
+                    hasher.update(f.read(limit))
+                    return hasher.hexdigest()
+                return hash_file_stream(f, hasher).hexdigest()
+            if mm is not None:
+                # Hash straight from the mapped pages in a single call
+                with mm:
+                    hasher.update(mm)
         return hasher.hexdigest()
     except Exception as e:
         logger.error(f"Error calculating checksum for {file_path}: {e}")
         return None
 
+def parse_pii_entities(pii_entities_str):
+    """Parse stored PII entities, stored as JSON or as a Python repr by older versions."""
+    try:
+        return json.loads(pii_entities_str)
+    except ValueError:
+        return ast.literal_eval(pii_entities_str)
+
+# In-memory copy of scan_history keyed by (file_path, scan_type), so the
+# already-scanned checks do not need a query per file
+_scan_index = None
+_scan_index_lock = threading.Lock()
+
+def get_scan_index():
+    """Return the scan_history index, loading it from the database on first use."""
+    global _scan_index
+    with _scan_index_lock:
+        if _scan_index is None:
+            try:
+                rows = get_db_connection().execute("""
+                    SELECT file_path, scan_type, file_size, file_modified, file_inode, file_mtime_ns,
+                           file_checksum, pii_entities
+                    FROM scan_history
+                """)
+                _scan_index = {(row[0], row[1]): row[2:] for row in rows}
+                logger.debug(f"Loaded {len(_scan_index)} previous scan results")
+            except sqlite3.Error as e:
+                logger.error(f"Database error loading previous scan results: {e}")
+                _scan_index = {}  # Treat everything as not scanned
+        return _scan_index
+
+def previous_entities(pii_entities_str):
+    """Return the stored PII entities of a previous scan."""
+    if pii_entities_str:
+        return parse_pii_entities(pii_entities_str)  # Returns the PII entities
+    return []  # Already scanned, no PII found
+
 def is_file_scanned(file_path, checksum, scan_type):
     """Check if file has been scanned and return PII entities."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT pii_entities FROM scan_history
-            WHERE file_path = ? AND file_checksum = ? AND scan_type = ?
-        """, (file_path, checksum, scan_type))
-        result = cursor.fetchone()
-        if result:
-            pii_entities_str = result[0]
-            if pii_entities_str:
-                return True, eval(pii_entities_str)  # Returns True and the PII entities
-            else:
-                return True, []  # Already scanned, no PII found
-        else:
-            return False, None  # Not scanned yet
-    except sqlite3.Error as e:
-        logger.error(f"Database error checking if file is scanned: {e}")
-        return False, None  # Treat as not scanned
-    finally:
-        if conn:
-            conn.close()
+    row = get_scan_index().get((file_path, scan_type))
+    if row and row[4] == checksum:
+        return True, previous_entities(row[5])
+    return False, None  # Not scanned yet
 
-def save_scan_result(file_path, pii_entities, file_size, file_modified, file_checksum, scan_type):
-    """Save scan results to database with improved error handling."""
-    conn = None
+def is_file_stat_scanned(file_path, file_meta, scan_type):
+    """Check if an unchanged file (same size, inode and mtime) has been scanned and return PII entities."""
+    row = get_scan_index().get((file_path, scan_type))
+    if row and row[:4] == file_meta:
+        return True, previous_entities(row[5])
+    if row and row[2] is None and row[3] is None and row[:2] == file_meta[:2]:
+        # Scanned by a version that only recorded size and mtime, fill in the
+        # inode and ns mtime so the next run matches on the full stat
+        pii_entities = previous_entities(row[5])
+        save_scan_result(file_path, pii_entities, file_meta, row[4], scan_type)
+        return True, pii_entities
+    return False, None  # Changed or not scanned yet
+
+# Scan results waiting to be written in one transaction
+_pending_results = []
+
+# Updates a rescanned file's row in place, unlike INSERT OR REPLACE which deletes and
+# reinserts it. Kept as one constant so sqlite3's statement cache always hits
+SAVE_RESULT_SQL = """
+    INSERT INTO scan_history
+    (file_path, scan_time, file_size, file_modified, file_inode, file_mtime_ns,
+     file_checksum, scan_type, pii_entities)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(file_path, scan_type) DO UPDATE SET
+        scan_time = excluded.scan_time,
+        file_size = excluded.file_size,
+        file_modified = excluded.file_modified,
+        file_inode = excluded.file_inode,
+        file_mtime_ns = excluded.file_mtime_ns,
+        file_checksum = excluded.file_checksum,
+        pii_entities = excluded.pii_entities
+"""
+
+def save_scan_result(file_path, pii_entities, file_meta, file_checksum, scan_type):
+    """Queue a scan result for the database, flushing every DB_FLUSH_INTERVAL results."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
         now = datetime.now(timezone.utc).isoformat()
+        file_size, file_modified, file_inode, file_mtime_ns = file_meta
         
         # Validate inputs
         if not isinstance(file_size, int):
@@ -260,259 +647,668 @@ def save_scan_result(file_path, pii_entities, file_size, file_modified, file_che
         if not file_checksum:
             raise ValueError("file_checksum cannot be None")
             
-        # Print debug info
-        logger.info("Saving scan result:")
-        logger.info(f"  Path: {file_path}")
-        logger.info(f"  Checksum: {file_checksum}")
-        logger.info(f"  Scan type: {scan_type}")
+        logger.debug("Saving scan result: %s (%s), checksum %s", file_path, scan_type, file_checksum)
             
-        # Insert or update the scan result
-        cursor.execute("""
-            INSERT OR REPLACE INTO scan_history 
-            (file_path, scan_time, file_size, file_modified, file_checksum, scan_type, pii_entities)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (file_path, now, file_size, file_modified, file_checksum, scan_type, str(pii_entities)))
+        pii_entities_str = json.dumps(pii_entities, separators=(',', ':'), ensure_ascii=False)
+        _pending_results.append((file_path, now, file_size, file_modified, file_inode, file_mtime_ns,
+                                 file_checksum, scan_type, pii_entities_str))
+        index = get_scan_index()
+        with _scan_index_lock:
+            index[(file_path, scan_type)] = (file_size, file_modified, file_inode, file_mtime_ns,
+                                             file_checksum, pii_entities_str)
+        if len(_pending_results) >= DB_FLUSH_INTERVAL:
+            flush_scan_results()
         
-        conn.commit()
-        logger.info(f"Scan result saved for: {file_path}")
+    except ValueError as e:
+        logger.error(f"Invalid data error: {e}")
+        raise
+
+def flush_scan_results():
+    """Write all queued scan results to the database in a single transaction."""
+    if not _pending_results:
+        return
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN")
+        # Insert or update the scan results
+        conn.executemany(SAVE_RESULT_SQL, _pending_results)
+        conn.execute("COMMIT")
+        logger.info(f"Saved {len(_pending_results)} scan results to database")
+        _pending_results.clear()
         
     except sqlite3.Error as e:
-        logger.error(f"Database error while saving scan result: {e}")
+        logger.error(f"Database error while saving scan results: {e}")
         logger.error(f"Error details: {str(e)}")
-        if conn:
-            conn.rollback()
-        raise
-    except ValueError as e:
-        logger.error(f"Invalid data error: {e}")
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
         raise
+
+def flush_scan_results_at_exit():
+    """Flush queued scan results when the process exits."""
+    try:
+        flush_scan_results()
+    except sqlite3.Error:
+        pass  # Already logged by flush_scan_results
+
+atexit.register(flush_scan_results_at_exit)  # Registered after close_db_connection so it runs first
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+DRAWING_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+SLIDE_PART = re.compile(r"ppt/slides/slide(\d+)\.xml$")
+
+# Text of the run content elements besides w:t and a:t, as python-docx and python-pptx
+# give it, so words on either side of a tab or line break stay apart
+RUN_CONTENT_TEXT = {
+    WORD_NS + "tab": "\t",
+    WORD_NS + "ptab": "\t",
+    WORD_NS + "br": "\n",
+    WORD_NS + "cr": "\n",
+    WORD_NS + "noBreakHyphen": "-",
+    DRAWING_NS + "br": "\v",
+}
+
+def run_content_text(elem):
+    """Return the text equivalent of a RUN_CONTENT_TEXT element."""
+    if elem.tag == WORD_NS + "br" and elem.get(WORD_NS + "type", "textWrapping") != "textWrapping":
+        return ""  # Page and column breaks have no text equivalent
+    if elem.tag == WORD_NS + "tab" and elem.attrib:
+        return ""  # A tab stop of the paragraph properties, run tabs have no attributes
+    return RUN_CONTENT_TEXT[elem.tag]
+
+def truncate_utf8(text, limit):
+    """Cut text to at most limit bytes of UTF-8 without splitting a character."""
+    return text.encode("utf-8")[:limit].decode("utf-8", "ignore")
+
+def extract_office_xml_text(file_path, part_names, ns, scan_type):
+    """Stream paragraph text straight out of the XML parts of an Office zip file."""
+    lines = []
+    total_bytes = 0
+    with zipfile.ZipFile(file_path) as archive:
+        if callable(part_names):
+            part_names = part_names(archive)
+        for part_name in part_names:
+            with archive.open(part_name) as part:
+                runs = []
+                for _, elem in ET.iterparse(part, events=("end",)):
+                    if elem.tag == ns + "t":
+                        if elem.text:
+                            runs.append(elem.text)
+                    elif elem.tag in RUN_CONTENT_TEXT:
+                        runs.append(run_content_text(elem))
+                    elif elem.tag == ns + "p":
+                        line = "".join(runs)
+                        runs = []
+                        lines.append(line)
+                        total_bytes += len(line.encode('utf-8')) + 1
+                        elem.clear()  # Paragraph is done, free its subtree
+                        if scan_type == "lite" and total_bytes > LITE_SCAN_LIMIT:
+                            return truncate_utf8("\n".join(lines), LITE_SCAN_LIMIT)
+    return "\n".join(lines) + "\n" if lines else ""
+
+def slide_part_names(archive):
+    """Return the slide XML parts of a .pptx archive in slide number order."""
+    slides = [(int(m.group(1)), name) for name in archive.namelist() if (m := SLIDE_PART.match(name))]
+    return [name for _, name in sorted(slides)]
+
+def extract_txt(file_path, scan_type):
+    """Extract text from a plain text file."""
+    with open(file_path, "rb") as f:
+        limit = LITE_SCAN_LIMIT if scan_type == "lite" else None
+        try:
+            mm = map_file(f, limit)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Cannot memory-map {file_path}, reading instead: {e}")
+            return f.read(-1 if limit is None else limit).decode("utf-8", "ignore")
+        if mm is None:
+            return ""
+        with mm:
+            return str(mm, "utf-8", "ignore")
+
+def extract_docx(file_path, scan_type):
+    """Extract paragraph text from a Word document."""
+    try:
+        return extract_office_xml_text(file_path, ["word/document.xml"], WORD_NS, scan_type)
+    except (KeyError, zipfile.BadZipFile, ET.ParseError) as e:
+        logger.debug(f"Falling back to python-docx for {file_path}: {e}")
+    document = Document(file_path)
+    lines = []
+    total_bytes = 0
+    for paragraph in document.paragraphs:
+        # paragraph.text rebuilds the string from its runs on every access
+        line = paragraph.text
+        lines.append(line)
+        total_bytes += len(line.encode('utf-8')) + 1
+        if scan_type == "lite" and total_bytes > LITE_SCAN_LIMIT:
+            return truncate_utf8("\n".join(lines), LITE_SCAN_LIMIT)
+    return "\n".join(lines) + "\n" if lines else ""
+
+def extract_xlsx(file_path, scan_type):
+    """Extract cell values from an Excel workbook, one line per row."""
+    # Suppress openpyxl warnings during workbook load
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        # Stream rows instead of building the full workbook object model, and skip
+        # loading external link parts that are never scanned
+        workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        lines = []
+        total_bytes = 0
+        for sheet in workbook.worksheets:
+            for row in sheet.iter_rows(values_only=True):
+                line = " ".join("" if value is None else str(value) for value in row)
+                lines.append(line)
+                total_bytes += len(line.encode('utf-8')) + 1
+                if scan_type == "lite" and total_bytes > LITE_SCAN_LIMIT:
+                    return truncate_utf8("\n".join(lines), LITE_SCAN_LIMIT)
+        return "\n".join(lines) + "\n" if lines else ""
     finally:
-        if conn:
-            conn.close()
+        workbook.close()
 
-def extract_text_from_file(file_path, scan_type):
-    """Extract text from various file types."""
+def extract_pptx(file_path, scan_type):
+    """Extract shape text from a PowerPoint presentation."""
     try:
-        if file_path.endswith(".txt"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read(LITE_SCAN_LIMIT) if scan_type == "lite" else f.read()
-                
-        elif file_path.endswith((".doc", ".docx")):
-            document = Document(file_path)
-            text = ""
-            for paragraph in document.paragraphs:
-                text += paragraph.text + "\n"
-                if scan_type == "lite" and len(text.encode('utf-8')) > LITE_SCAN_LIMIT:
-                    return text[:LITE_SCAN_LIMIT].decode('utf-8', 'ignore')
-            return text
-            
-        elif file_path.endswith(".xlsx"):
-            # Suppress openpyxl warnings during workbook load
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                workbook = load_workbook(file_path)
-                text = ""
-                for sheet in workbook:
-                    for row in sheet.iter_rows():
-                        text += " ".join([str(cell.value) if cell.value is not None else "" for cell in row]) + "\n"
-                        if scan_type == "lite" and len(text.encode('utf-8')) > LITE_SCAN_LIMIT:
-                            return text[:LITE_SCAN_LIMIT].decode('utf-8', 'ignore')
-                return text
-            
-        elif file_path.endswith(".pptx"):
-            presentation = Presentation(file_path)
-            text = ""
-            for slide in presentation.slides:
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        text += shape.text + "\n"
-                    if scan_type == "lite" and len(text.encode('utf-8')) > LITE_SCAN_LIMIT:
-                        return text[:LITE_SCAN_LIMIT].decode('utf-8', 'ignore')
-            return text
-            
-        return None
+        return extract_office_xml_text(file_path, slide_part_names, DRAWING_NS, scan_type)
+    except (KeyError, zipfile.BadZipFile, ET.ParseError) as e:
+        logger.debug(f"Falling back to python-pptx for {file_path}: {e}")
+    presentation = Presentation(file_path)
+    lines = []
+    total_bytes = 0
+    for slide in presentation.slides:
+        for shape in slide.shapes:
+            # shape.text rebuilds the string from the XML on every access
+            shape_text = getattr(shape, "text", None)
+            if shape_text:
+                lines.append(shape_text)
+                total_bytes += len(shape_text.encode('utf-8')) + 1
+            if scan_type == "lite" and total_bytes > LITE_SCAN_LIMIT:
+                return truncate_utf8("\n".join(lines), LITE_SCAN_LIMIT)
+    return "\n".join(lines) + "\n" if lines else ""
+
+# Text extractor for each supported file extension
+EXTRACTORS = {
+    ".txt": extract_txt,
+    ".doc": extract_docx,
+    ".docx": extract_docx,
+    ".xlsx": extract_xlsx,
+    ".pptx": extract_pptx,
+}
+
+def extract_text_from_file(file_path, scan_type, file_extension):
+    """Extract text from various file types, file_extension is the lowercase extension."""
+    try:
+        extractor = EXTRACTORS.get(file_extension)
+        return extractor(file_path, scan_type) if extractor else None
     except Exception as e:
         logger.error(f"Error extracting text from {file_path}: {e}")
         return None
 
+SENTENCE_ENDINGS = {".", "!", "?"}
+
 def chunk_text(text, max_length=MAX_CHUNK_LENGTH):
     """Split text into chunks using GLiNER's words_splitter."""
     try:
         if not text:
             return []
         
-        # Get all tokens at once, extract only the token text from tuples
-        tokens = [t[0] for t in gliner_model.data_processor.words_splitter(text)]
+        # Get all tokens at once as (token, start, end) tuples
+        tokens = list(gliner_model.data_processor.words_splitter(text))
         
-        # Initialize variables for chunking
+        # Slice chunks straight out of the original text using the token
+        # character offsets instead of re-joining the token strings
+        window = max_length - 2  # Account for special tokens
         chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        # Process tokens into chunks
-        for token in tokens:
-            if current_length + 1 > max_length - 2:  # Account for special tokens
-                # Save current chunk
-                if current_chunk:
-                    chunks.append(" ".join(current_chunk))
-                # Start new chunk
-                current_chunk = [token]
-                current_length = 1
-            else:
-                current_chunk.append(token)
-                current_length += 1
-        
-        # Add the last chunk if not empty
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
+        start = 0
+        while start < len(tokens):
+            end = min(start + window, len(tokens))
+            if end < len(tokens):
+                # Cut after the last sentence that fits so entities are not split
+                # across chunks, unless that would leave the chunk under half full
+                for i in range(end - 1, start + window // 2, -1):
+                    if tokens[i][0] in SENTENCE_ENDINGS:
+                        end = i + 1
+                        break
+            chunks.append(text[tokens[start][1]:tokens[end - 1][2]])
+            start = end
         
-        logger.debug(f"Split text into {len(chunks)} chunks")
+        if chunks and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Split text into %d chunks, avg %.0f tokens", len(chunks), len(tokens) / len(chunks))
         return chunks
         
     except Exception as e:
         logger.warning(f"Error chunking text: {e}")
         return []
 
-def detect_pii(text, scan_type="full"):
-    """Detect PII in text using GLiNER model."""
+# Detections of recently seen chunks, boilerplate such as headers, footers and
+# disclaimers repeats across files and only needs to go through GLiNER once
+_chunk_cache = OrderedDict()
+
+def detect_pii_batch(texts, scan_type="full"):
+    """Detect PII in a list of texts using batched GLiNER inference.
+
+    Returns one list of entities per input text, in input order, or None if
+    GLiNER failed so that no result gets recorded for these texts.
+    """
     try:
-        if not gliner_model:
-            return []
+        if not gliner_model or not texts:
+            return [[] for _ in texts]
 
         labels_to_use = PII_LABELS_FULL if scan_type == "full" else PII_LABELS
-        
-        # Use the new suppressor
-        with SuppressStdoutStderr():
-            entities = gliner_model.predict_entities(text, labels_to_use)
-        
-        formatted_entities = []
-        for entity in entities:
-            formatted_entities.append({
-                "text": entity["text"],
-                "label": entity["label"]
-            })
-            
-        return formatted_entities
-        
+        embeddings = label_embeddings.get(scan_type)
+
+        # Answer repeated chunks from the cache, each distinct chunk left is inferred once
+        results = [None] * len(texts)
+        pending = {}
+        for i, text in enumerate(texts):
+            key = (scan_type, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+            if key in _chunk_cache:
+                _chunk_cache.move_to_end(key)
+                results[i] = _chunk_cache[key]
+            else:
+                pending.setdefault(key, []).append(i)
+
+        # Group similarly sized chunks so each batch pads as little as possible
+        keys = sorted(pending, key=lambda key: len(texts[pending[key][0]]))
+
+        # Run the chunks through GLiNER in batches to bound memory use
+        with SuppressStdoutStderr(), torch.inference_mode():
+            for start in range(0, len(keys), GLINER_BATCH_SIZE):
+                batch_keys = keys[start:start + GLINER_BATCH_SIZE]
+                batch = [texts[pending[key][0]] for key in batch_keys]
+                predictions = predict_entities(batch, labels_to_use, embeddings)
+                for key, entities in zip(batch_keys, predictions):
+                    entities = [{"text": entity["text"], "label": entity["label"]} for entity in entities]
+                    for i in pending[key]:
+                        results[i] = entities
+                    if PII_CACHE_SIZE > 0:
+                        _chunk_cache[key] = entities
+                        if len(_chunk_cache) > PII_CACHE_SIZE:
+                            _chunk_cache.popitem(last=False)
+
+        return results
+
     except Exception as e:
-        logger.warning(f"Error detecting PII: {e}")
+        logger.error(f"Error detecting PII: {e}")
+        return None
+
+def load_text_chunks(file_path, scan_type, file_extension, text=None):
+    """Extract a file's text unless already given and split it into chunks.
+
+    Returns [] if there is nothing to scan and None if the text could not be extracted.
+    """
+    if text is None:
+        text = extract_text_from_file(file_path, scan_type, file_extension)
+    if text is None:
+        logger.error(f"Failed to extract text from {file_path}")
+        return None
+    if not text.strip():
+        logger.debug("No text to scan in %s", file_path)
         return []
+    return chunk_text(text, MAX_CHUNK_LENGTH)
 
-def scan_file_for_pii(file_path, scan_type):
-    """Scan a file for PII entities."""
-    try:
-        text = extract_text_from_file(file_path, scan_type)
-        if not text:
-            logger.error(f"Failed to extract text from {file_path}")
-            return []
+def report_pii(file_path, scan_type, all_pii_entities):
+    """Log and print the PII found in a file."""
+    if all_pii_entities:
+        # Get unique labels
+        labels = ", ".join(sorted(set(entity['label'] for entity in all_pii_entities)))
+        
+        # Log detailed message
+        log_message = f"PII data potentially exposed in {file_path} ({scan_type}):"
+        for entity in all_pii_entities:
+            log_message += f"\n  - {entity['label']}: {entity['text']}"
+        logger.warning(log_message)
+        
+        # Print messages for Veeam detection
+        print("PII data potentially exposed")  # For Veeam regex match
+        print(f"PII_DETECTED: {labels}")  # For structured output
+
+def scan_chunks_for_pii(file_path, scan_type, chunks, stop_on_first=False):
+    """Scan a file's chunks for PII entities.
 
-        chunks = chunk_text(text, MAX_CHUNK_LENGTH)
-        all_pii_entities = []
+    With stop_on_first, chunks are scanned one batch at a time and scanning
+    stops after the first batch that contains PII. Returns None if detection failed.
+    """
+    all_pii_entities = []
 
-        logger.info(f"Processing chunks for file: {file_path} ({scan_type})")
-        for i, chunk in enumerate(chunks):
-            logger.debug(f"Processing chunk {i + 1}/{len(chunks)}")
-            pii_entities = detect_pii(chunk, scan_type)
-            if pii_entities:
+    logger.debug("Processing %d chunks for file: %s (%s)", len(chunks), file_path, scan_type)
+    if stop_on_first:
+        for start in range(0, len(chunks), GLINER_BATCH_SIZE):
+            results = detect_pii_batch(chunks[start:start + GLINER_BATCH_SIZE], scan_type)
+            if results is None:
+                return None
+            for pii_entities in results:
                 all_pii_entities.extend(pii_entities)
+            if all_pii_entities:
+                logger.debug("Stopping early after %d of %d chunks", start + GLINER_BATCH_SIZE, len(chunks))
+                break
+    else:
+        results = detect_pii_batch(chunks, scan_type)
+        if results is None:
+            return None
+        for pii_entities in results:
+            all_pii_entities.extend(pii_entities)
 
-        if all_pii_entities:
-            # Get unique labels
-            labels = ", ".join(sorted(set(entity['label'] for entity in all_pii_entities)))
-            
-            # Log detailed message
-            log_message = f"PII data potentially exposed in {file_path} ({scan_type}):"
-            for entity in all_pii_entities:
-                log_message += f"\n  - {entity['label']}: {entity['text']}"
-            logger.warning(log_message)
-            
-            # Print messages for Veeam detection
-            print("PII data potentially exposed")  # For Veeam regex match
-            print(f"PII_DETECTED: {labels}")  # For structured output
-            
-        return all_pii_entities
-    except Exception as e:
-        logger.error(f"Error scanning file {file_path}: {e}")
-        sys.exit(EXIT_PII_DETECTION_ERROR)
+    return all_pii_entities
 
-def process_file(file_path, scan_type):
-    """Process a single file for PII scanning."""
-    logger.info(f"\nProcessing file: {file_path}")
-    
-    file_extension = os.path.splitext(file_path)[1].lower()
-    if file_extension not in ALLOWED_FILE_TYPES:
-        logger.warning(f"Skipping unsupported file type: {file_extension}")
+def get_file_stat(file_path, file_stat=None):
+    """Return (size, ISO modification time, inode, mtime in ns) of a file, from file_stat when given."""
+    if file_stat is None or (file_stat.st_ino == 0 and sys.platform == "win32"):
+        # DirEntry.stat() on Windows always reports st_ino as 0, os.stat() gives the NTFS file index
+        file_stat = os.stat(file_path)
+    file_size = file_stat.st_size
+    file_modified = datetime.fromtimestamp(file_stat.st_mtime, tz=timezone.utc).isoformat()
+    return file_size, file_modified, file_stat.st_ino, file_stat.st_mtime_ns
+
+def iter_supported_files(path):
+    """Yield (file_path, file_extension, stat_result) for every supported file under path.
+
+    The extension is checked on the directory entry name before anything is
+    stat'ed, and both the lowercase extension and the entry's stat are reused
+    by the caller.
+    """
+    if os.path.isfile(path):
+        file_extension = os.path.splitext(path)[1].lower()
+        if file_extension in ALLOWED_FILE_TYPES:
+            yield path, file_extension, os.stat(path)
         return
+    # Walk with an explicit stack so deep trees neither hit the recursion limit
+    # nor keep a directory handle open per level
+    directories = [path]
+    while directories:
+        directory = directories.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(entry.path)
+                            continue
+                        file_extension = os.path.splitext(entry.name)[1].lower()
+                        if file_extension in ALLOWED_FILE_TYPES and entry.is_file():
+                            yield entry.path, file_extension, entry.stat()
+                    except OSError as e:
+                        logger.warning(f"Skipping {entry.path}: {e}")
+        except OSError as e:
+            logger.warning(f"Cannot read directory {directory}: {e}")
 
-    file_size = os.path.getsize(file_path)
-    file_modified = datetime.fromtimestamp(os.path.getmtime(file_path), tz=timezone.utc).isoformat()
-    
-    logger.info("Calculating checksum...")
+def report_previous_scan(file_path, scan_type, previous_pii_entities):
+    """Report the result of a previous scan of an unchanged file."""
+    if previous_pii_entities:
+        labels = ", ".join(sorted(set(entity['label'] for entity in previous_pii_entities)))
+        logger.warning(f"PII data potentially exposed in previously scanned file: {file_path} ({scan_type}): {labels}")
+        print("PII data potentially exposed")
+        print(f"PII_DETECTED: {labels}")
+    else:
+        logger.info("Skipping already scanned file: %s (%s) - No PII found in previous scan", file_path, scan_type)
+
+def save_empty_file(file_path, scan_type, file_meta):
+    """Record a 0-byte file as scanned without reading it."""
+    save_scan_result(file_path, [], file_meta, new_hasher().hexdigest(), scan_type)
+
+def read_txt_once(file_path, scan_type, file_extension):
+    """Checksum and decode a .txt file from a single mapping.
+
+    Returns (checksum, text), or None when the file is not a non-empty .txt
+    file that can be mapped, in which case it is read the usual way.
+    """
+    if file_extension != ".txt":
+        return None
+    try:
+        with open(file_path, "rb") as f:
+            # Lite checksums and lite text cover the same first LITE_SCAN_LIMIT bytes
+            mm = map_file(f, LITE_SCAN_LIMIT if scan_type == "lite" else None)
+            if mm is None:
+                return None
+            with mm:
+                hasher = new_hasher()
+                hasher.update(mm)
+                return hasher.hexdigest(), str(mm, "utf-8", "ignore")
+    except (OSError, ValueError) as e:
+        logger.debug("Cannot memory-map %s, reading it twice: %s", file_path, e)
+        return None
+
+def prepare_file(file_path, scan_type, file_extension):
+    """Checksum a file and extract its text, run in the scan worker processes."""
+    prepared = read_txt_once(file_path, scan_type, file_extension)
+    if prepared:
+        return prepared
     file_checksum = calculate_checksum(file_path, scan_type)
+    # None when extraction failed, the main process then tries once more and records
+    # nothing if that fails too
+    text = extract_text_from_file(file_path, scan_type, file_extension) if file_checksum else None
+    return file_checksum, text
 
+def reuse_previous_scan(file_path, scan_type, file_meta, file_checksum):
+    """Handle a file whose checksum failed or matches an earlier scan.
+
+    Returns (handled, pii_entities); files that are not handled still need scanning.
+    """
     if file_checksum is None:
         logger.warning(f"Skipping {file_path} due to checksum error.")
-        return
+        return True, []
 
-    logger.info(f"Checksum: {file_checksum}")
+    logger.debug("Checksum: %s", file_checksum)
 
     already_scanned, previous_pii_entities = is_file_scanned(file_path, file_checksum, scan_type)
+    if not already_scanned:
+        return False, None
+
+    report_previous_scan(file_path, scan_type, previous_pii_entities)
+    # Same content under new metadata (touched, restored or copied back), record the
+    # new stat so the next run can skip the checksum
+    save_scan_result(file_path, previous_pii_entities, file_meta, file_checksum, scan_type)
+    return True, previous_pii_entities
+
+def record_scan(file_path, scan_type, file_meta, file_checksum, pii_entities):
+    """Report and save the result of scanning a file. Returns True if it contains PII."""
+    report_pii(file_path, scan_type, pii_entities)
+    save_scan_result(file_path, pii_entities, file_meta, file_checksum, scan_type)
+    logger.info("Scanned file: %s (%s) - %d PII entities found", file_path, scan_type, len(pii_entities))
+    return bool(pii_entities)
+
+def scan_prepared_files(prepared, scan_type):
+    """Scan checksummed files, sharing GLiNER batches between small files.
+
+    Files with fewer chunks than GLINER_BATCH_SIZE are held back until enough
+    chunks have accumulated to fill a batch, so a directory of small documents
+    is not scanned one short batch per file. Returns True if any PII was found.
+    """
+    pii_found = False
+    group = []
+    group_chunks = 0
+
+    def flush_group():
+        nonlocal pii_found, group_chunks
+        if not group:
+            return
+        try:
+            results = detect_pii_batch([chunk for *_, chunks in group for chunk in chunks], scan_type)
+            if results is None:
+                # Recording these files as PII-free would stop them from ever being rescanned
+                logger.error(f"PII detection failed, not recording results for {len(group)} files")
+            else:
+                results = iter(results)
+                for file_path, file_meta, file_checksum, chunks in group:
+                    pii_entities = [entity for _ in chunks for entity in next(results)]
+                    pii_found = record_scan(file_path, scan_type, file_meta, file_checksum, pii_entities) or pii_found
+        except Exception as e:
+            logger.error(f"Error scanning files for PII: {e}")
+            sys.exit(EXIT_PII_DETECTION_ERROR)
+        group.clear()
+        group_chunks = 0
+
+    for (file_path, file_extension, file_meta), (file_checksum, text) in prepared:
+        try:
+            handled, pii_entities = reuse_previous_scan(file_path, scan_type, file_meta, file_checksum)
+            if handled:
+                pii_found = pii_found or bool(pii_entities)
+                continue
+
+            logger.debug("Scanning file for PII: %s (%s)", file_path, scan_type)
+            chunks = load_text_chunks(file_path, scan_type, file_extension, text)
+            if chunks is None:
+                continue  # Not recorded, so the file is tried again on the next run
+            if not chunks:
+                record_scan(file_path, scan_type, file_meta, file_checksum, [])
+            elif len(chunks) < GLINER_BATCH_SIZE:
+                group.append((file_path, file_meta, file_checksum, chunks))
+                group_chunks += len(chunks)
+                if group_chunks >= GLINER_BATCH_SIZE:
+                    flush_group()
+            else:
+                try:
+                    # A lite scan only needs to know whether the file contains PII at all
+                    pii_entities = scan_chunks_for_pii(file_path, scan_type, chunks, stop_on_first=(scan_type == "lite"))
+                except Exception as e:
+                    logger.error(f"Error scanning file {file_path}: {e}")
+                    sys.exit(EXIT_PII_DETECTION_ERROR)
+                if pii_entities is None:
+                    logger.error(f"PII detection failed for {file_path}, not recording a result")
+                else:
+                    pii_found = record_scan(file_path, scan_type, file_meta, file_checksum, pii_entities) or pii_found
+        except FileNotFoundError:
+            logger.error(f"File not found: {file_path}")
+            sys.exit(EXIT_FILE_NOT_FOUND)
+        except Exception as e:
+            logger.error(f"Error processing file {file_path}: {e}")
+            sys.exit(EXIT_GENERAL_ERROR)
 
-    if already_scanned:
-        if previous_pii_entities:
-            labels = ", ".join(sorted(set(entity['label'] for entity in previous_pii_entities)))
-            logger.warning(f"PII data potentially exposed in previously scanned file: {file_path} ({scan_type}): {labels}")
-            print("PII data potentially exposed")
-            print(f"PII_DETECTED: {labels}")
+    flush_group()
+    return pii_found
+
+def prepare_in_pool(executor, pending, scan_type, window):
+    """Yield (file, prepared) pairs in order, keeping at most window files in flight.
+
+    Office files are extracted in the pool. Plain text files are read in this
+    process when their turn comes, since mapping and decoding them is cheap and
+    their whole text would otherwise be pickled back from the worker.
+    """
+    in_flight = deque()
+    for item in pending:
+        if item[1] == ".txt":
+            in_flight.append((item, None))
         else:
-            logger.info(f"Skipping already scanned file: {file_path} ({scan_type}) - No PII found in previous scan")
-        return
+            in_flight.append((item, executor.submit(prepare_file, item[0], scan_type, item[1])))
+        if len(in_flight) >= window:
+            item, future = in_flight.popleft()
+            yield item, future.result() if future else prepare_file(item[0], scan_type, item[1])
+    while in_flight:
+        item, future = in_flight.popleft()
+        yield item, future.result() if future else prepare_file(item[0], scan_type, item[1])
+
+def scan_directory(directory, scan_type, workers=SCAN_WORKERS):
+    """Scan all supported files in a directory, or a single file. Returns True if any PII was found."""
+    pii_found = False
+    pending = []
+    if not os.path.exists(directory):
+        logger.error(f"File not found: {directory}")
+        sys.exit(EXIT_FILE_NOT_FOUND)
 
-    logger.info(f"Scanning file for PII: {file_path} ({scan_type})")
-    pii_entities = scan_file_for_pii(file_path, scan_type)
+    for file_path, file_extension, file_stat in iter_supported_files(directory):
+        logger.debug("Processing file: %s", file_path)
+        file_meta = get_file_stat(file_path, file_stat)
+        already_scanned, previous_pii_entities = is_file_stat_scanned(file_path, file_meta, scan_type)
+        if already_scanned:
+            report_previous_scan(file_path, scan_type, previous_pii_entities)
+            pii_found = pii_found or bool(previous_pii_entities)
+        elif file_meta[0] == 0:
+            save_empty_file(file_path, scan_type, file_meta)
+        else:
+            pending.append((file_path, file_extension, file_meta))
+
+    office_files = sum(file_extension != ".txt" for _, file_extension, _ in pending)
+    if workers > 1 and office_files > 1:
+        # Checksums and text extraction of Office files run in worker processes, while
+        # GLiNER inference and database writes stay in this process
+        if MAX_SCAN_WORKERS:
+            workers = min(workers, MAX_SCAN_WORKERS)
+        # Always spawn, forking would copy the BLAKE3 and torch thread pools already
+        # running in this process into the workers, where they deadlock
+        executor = ProcessPoolExecutor(max_workers=min(workers, office_files),
+                                       mp_context=multiprocessing.get_context("spawn"))
+        prepared = prepare_in_pool(executor, pending, scan_type, workers * 2)
+    else:
+        executor = None
+        # Office files are only extracted once their checksum turns out to be new
+        prepared = ((item, read_txt_once(item[0], scan_type, item[1]) or (calculate_checksum(item[0], scan_type), None))
+                    for item in pending)
 
-    logger.info("Saving results to database...")
-    save_scan_result(file_path, pii_entities, file_size, file_modified, file_checksum, scan_type)
+    try:
+        pii_found = scan_prepared_files(prepared, scan_type) or pii_found
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
 
-def scan_directory(directory, scan_type):
-    """Scan all supported files in a directory."""
-    for root, _, files in os.walk(directory):
-        for file in files:
-            file_path = os.path.join(root, file)
-            process_file(file_path, scan_type)
+    flush_scan_results()
+    return pii_found
 
 # Add a function to verify database
 def verify_database():
     """Verify database exists and is properly initialized."""
-    conn = None
     try:
         if not os.path.exists(DB_FILE):
             logger.debug(f"Database file not found at: {DB_FILE}")  # Changed to debug level
             init_db()
+            migrate_db()
             return
             
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
         # Check if table exists
-        cursor.execute("""
+        result = get_db_connection().execute("""
             SELECT name FROM sqlite_master 
             WHERE type='table' AND name='scan_history'
-        """)
+        """).fetchone()
         
-        if not cursor.fetchone():
+        if not result:
             logger.debug("Database exists but missing required table.")  # Changed to debug level
-            if conn:
-                conn.close()
-            init_db()
         else:
             logger.debug("Database verified successfully.")  # Changed to debug level
+        
+        # Idempotent, migrate_db upgrades older databases
+        init_db()
+        migrate_db()
             
     except sqlite3.Error as e:
         logger.warning(f"Database verification error: {e}")  # Changed to warning level
         sys.exit(EXIT_DB_ERROR)
-    finally:
-        if conn:
-            conn.close()
+
+# Bumped whenever migrate_db learns a new one-time upgrade, stored as PRAGMA user_version
+DB_SCHEMA_VERSION = 2
+
+def migrate_db():
+    """Upgrade rows written by older versions of the scanner, once per database."""
+    conn = get_db_connection()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= DB_SCHEMA_VERSION:
+        return
+    
+    try:
+        conn.execute("BEGIN")
+        
+        # Version 1: pii_entities used to be stored as a Python repr instead of JSON
+        if version < 1:
+            rows = conn.execute("SELECT id, pii_entities FROM scan_history WHERE pii_entities LIKE '[{''%'").fetchall()
+            updates = []
+            for row_id, entities in rows:
+                try:
+                    updates.append((json.dumps(ast.literal_eval(entities), separators=(',', ':'), ensure_ascii=False), row_id))
+                except (ValueError, SyntaxError) as e:
+                    logger.warning(f"Cannot migrate scan result {row_id}, leaving it as is: {e}")
+            conn.executemany("UPDATE scan_history SET pii_entities = ? WHERE id = ?", updates)
+            logger.info(f"Migrated {len(updates)} scan results to JSON")
+        
+        # Version 2: inode and nanosecond mtime for the unchanged-file check, left NULL on
+        # old rows until is_file_stat_scanned matches them on size and mtime
+        if version < 2:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(scan_history)")}
+            for column in ("file_inode", "file_mtime_ns"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE scan_history ADD COLUMN {column} INTEGER")
+        
+        conn.execute(f"PRAGMA user_version={DB_SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
 
 def custom_formatwarning(message, category, filename, lineno, line=None):
     """Custom format for UserWarning, logs it as INFO."""
@@ -522,15 +1318,18 @@ def custom_formatwarning(message, category, filename, lineno, line=None):
 warnings.formatwarning = custom_formatwarning
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Needed for worker processes in the PyInstaller exe
     try:
         verify_database()
         init_nltk()
         
         parser = argparse.ArgumentParser(description="PII Scanner with Lite and Full Scan Options")
-        parser.add_argument("path", help="The directory to scan")
+        parser.add_argument("path", help="The directory or file to scan")
         parser.add_argument("--scan-type", choices=["lite", "full"], default="full",
                           help="Specify 'lite' for a quick 1MB scan or 'full' for a complete scan (default: full)")
         parser.add_argument("--verbose", action="store_true", help="Enable verbose logging (DEBUG level)")
+        parser.add_argument("--workers", type=int, default=SCAN_WORKERS,
+                          help=f"Number of processes reading and extracting files, 1 scans serially (default: {SCAN_WORKERS})")
 
         args = parser.parse_args()
         
@@ -546,44 +1345,15 @@ if __name__ == "__main__":
             logger.setLevel(logging.DEBUG)
             logger.debug("Verbose logging enabled")
 
+        log_configured_labels()
+
         # Initialize models
+        init_gliner_model()
         if gliner_model is None:
             logger.error("Failed to initialize required models")
             sys.exit(EXIT_GLINER_INIT_ERROR)
 
-        # Scan directory using process_file
-        pii_found = False
-        for root, _, files in os.walk(args.path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                try:
-                    if os.path.splitext(file)[1].lower() not in ALLOWED_FILE_TYPES:
-                        continue
-                        
-                    # Use process_file instead of scan_file_for_pii directly
-                    process_file(file_path, args.scan_type)
-                    
-                    # Check if PII was found by querying the database
-                    conn = sqlite3.connect(DB_FILE)
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        SELECT pii_entities 
-                        FROM scan_history 
-                        WHERE file_path = ? AND scan_type = ?
-                    """, (file_path, args.scan_type))
-                    
-                    result = cursor.fetchone()
-                    if result and result[0] != '[]':
-                        pii_found = True
-                    
-                    conn.close()
-                        
-                except FileNotFoundError:
-                    logger.error(f"File not found: {file_path}")
-                    sys.exit(EXIT_FILE_NOT_FOUND)
-                except Exception as e:
-                    logger.error(f"Error processing file {file_path}: {e}")
-                    sys.exit(EXIT_GENERAL_ERROR)
+        pii_found = scan_directory(args.path, args.scan_type, max(1, args.workers))
 
         logger.info("Scanning complete.")
         sys.exit(EXIT_PII_FOUND if pii_found else EXIT_SUCCESS)